@@ -7,12 +7,387 @@ that work with LightRAG by handling Azure-specific URL and deployment requiremen
 """
 
 import os
-import base64
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
 from openai import AsyncAzureOpenAI
 import numpy as np
+import tiktoken
 from typing import Any
 from dotenv import load_dotenv
 
+try:
+    # SIMD-accelerated base64, noticeably faster on large embedding batches
+    from pybase64 import b64decode
+except ImportError:
+    from base64 import b64decode
+
+logger = logging.getLogger(__name__)
+
+# Read .env once at import; the functions below never touch the environment
+load_dotenv()
+
+
+@dataclass(frozen=True, slots=True)
+class _AzureConfig:
+    """Azure OpenAI settings shared by the LLM and embedding functions"""
+
+    api_key: str | None
+    endpoint: str | None  # e.g., https://your-resource.openai.azure.com
+    llm_deployment: str | None
+    embed_deployment: str | None  # e.g., text-embedding-3-small
+    llm_api_version: str
+    embed_api_version: str
+
+    @classmethod
+    def from_env(cls) -> "_AzureConfig":
+        return cls(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            llm_deployment=os.getenv("AZURE_OPENAI_LLM_DEPLOYMENT"),
+            embed_deployment=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+            llm_api_version=os.getenv("AZURE_LLM_API_VERSION", "2024-08-01-preview"),
+            # Use embedding-specific API version
+            embed_api_version=os.getenv("AZURE_EMBEDDING_API_VERSION", "2023-05-15"),
+        )
+
+
+_config = _AzureConfig.from_env()
+
+# LightRAG-specific parameters that should not be passed to the API
+_LIGHTRAG_PARAMS = frozenset({
+    'azure_endpoint', 'api_version', 'azure_deployment', 'hashing_kv',
+    'keyword_extraction', 'enable_cot'
+})
+
+# Per-request embedding limits. Older ada-002 deployments accept 16 inputs per
+# request, text-embedding-3 deployments accept up to 2048.
+AZURE_EMBED_MAX_INPUTS = int(os.getenv("AZURE_EMBED_MAX_INPUTS", "16"))
+AZURE_EMBED_MAX_TOKENS = 8000
+
+# Embeddings are cached on disk keyed by (deployment, dimensions, text); set
+# AZURE_EMBED_CACHE_DIR to an empty string to disable the cache.
+AZURE_EMBED_CACHE_DIR = os.getenv("AZURE_EMBED_CACHE_DIR", "./.embed_cache")
+
+# Completions are kept in an in-process LRU. Only deterministic requests
+# (temperature explicitly 0) are cached unless AZURE_LLM_CACHE_HOT=1.
+AZURE_LLM_CACHE_SIZE = int(os.getenv("AZURE_LLM_CACHE_SIZE", "2048"))
+AZURE_LLM_CACHE_HOT = os.getenv("AZURE_LLM_CACHE_HOT") == "1"
+
+# Upper bound on in-flight requests. Past Azure's rate limit, more concurrency
+# only buys 429 responses and SDK retry backoff.
+AZURE_EMBED_CONCURRENCY = int(os.getenv("AZURE_EMBED_CONCURRENCY", "8"))
+AZURE_LLM_CONCURRENCY = int(os.getenv("AZURE_LLM_CONCURRENCY", "4"))
+
+_embed_cache = None
+_llm_cache: OrderedDict[bytes, str] = OrderedDict()
+
+# Requests currently on the wire, so concurrent identical calls share them.
+# Embedding entries map a text's cache key to (task, row of the task's result).
+_llm_inflight: dict[bytes, asyncio.Task] = {}
+_embed_inflight: dict[bytes, tuple[asyncio.Task, int]] = {}
+
+# Row width last seen per cache scope. The deployment's model decides it, so
+# azure_openai_embed.embedding_dim is only a fallback until rows arrive.
+_embed_widths: dict[str, int] = {}
+
+# Clients are reused across calls so httpx can keep its connection pool (and
+# TLS sessions) alive. Clients and semaphores are bound to the event loop they
+# were created on, hence the loop id in the registry keys.
+_clients: dict[tuple, tuple[asyncio.AbstractEventLoop, AsyncAzureOpenAI]] = {}
+_semaphores: dict[tuple, tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]] = {}
+
+
+def _loop_local(registry: dict, kind: str, factory):
+    """Return ``registry``'s object for ``kind`` on the running loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    key = (id(loop), kind)
+    cached = registry.get(key)
+    if cached is not None and cached[0] is loop:
+        return cached[1]
+
+    value = factory()
+    registry[key] = (loop, value)
+    return value
+
+
+def _new_client(kind: str) -> AsyncAzureOpenAI:
+    return AsyncAzureOpenAI(
+        api_key=_config.api_key,
+        azure_endpoint=_config.endpoint,
+        api_version=_config.llm_api_version if kind == "llm" else _config.embed_api_version,
+    )
+
+
+def _get_client(kind: str) -> AsyncAzureOpenAI:
+    """Return the shared AsyncAzureOpenAI client for ``kind`` on the running loop"""
+    return _loop_local(_clients, kind, lambda: _new_client(kind))
+
+
+def _get_semaphore(kind: str) -> asyncio.Semaphore:
+    """Return the semaphore limiting in-flight ``kind`` requests on the running loop"""
+    limit = AZURE_LLM_CONCURRENCY if kind == "llm" else AZURE_EMBED_CONCURRENCY
+    return _loop_local(_semaphores, kind, lambda: asyncio.Semaphore(limit))
+
+
+def _filter_kwargs(kwargs: dict[str, Any]) -> dict[str, Any]:
+    """Drop LightRAG-specific parameters before calling the API
+
+    ``kwargs`` is the fresh dict of a ``**kwargs`` call, so it is returned
+    unchanged on the common path where there is nothing to drop.
+    """
+    if kwargs.keys().isdisjoint(_LIGHTRAG_PARAMS):
+        return kwargs
+    return {k: kwargs[k] for k in kwargs.keys() - _LIGHTRAG_PARAMS}
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """The cl100k_base encoding, or None if it cannot be loaded
+
+    tiktoken downloads the encoding on first use, so offline the token
+    counts fall back to an estimate rather than failing the embedding call.
+    """
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("cl100k_base unavailable, estimating embedding token counts: %s", e)
+        return None
+
+
+@lru_cache(maxsize=100_000)
+def _count_tokens(text: str) -> int:
+    """Count cl100k_base tokens of an embedding input
+
+    Memoised because RAG pipelines embed the same chunks over and over;
+    encode_ordinary skips the special-token scan.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        # Every token covers at least one byte, so this never undercounts
+        return len(text.encode())
+    return len(encoding.encode_ordinary(text))
+
+
+def _split_batches(texts: list[str]) -> list[list[str]]:
+    """Greedily pack texts into sub-batches that respect Azure's request limits"""
+    # Tokens never outnumber UTF-8 bytes, so small calls fit in one request
+    # without loading the tokenizer at all
+    if len(texts) <= AZURE_EMBED_MAX_INPUTS and (
+        sum(len(text.encode()) for text in texts) <= AZURE_EMBED_MAX_TOKENS
+    ):
+        return [texts]
+
+    batches = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        tokens = _count_tokens(text)
+        if current and (
+            len(current) >= AZURE_EMBED_MAX_INPUTS
+            or current_tokens + tokens > AZURE_EMBED_MAX_TOKENS
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _decode_embeddings(responses) -> np.ndarray:
+    """Decode embeddings responses into a single (n, dim) float32 matrix
+
+    ``dim`` is taken from the data, since a ``dimensions`` argument or the
+    deployment's model decides it. base64 rows are decoded into one bytearray
+    which then backs the returned array, so the matrix costs a single
+    allocation and no per-row arrays. Rows only arrive as plain lists of
+    floats if the caller asked for another encoding_format.
+    """
+    rows = [dp.embedding for response in responses for dp in response.data]
+    if not rows:
+        return np.empty((0, azure_openai_embed.embedding_dim), dtype=np.float32)
+    if all(isinstance(emb, str) for emb in rows):
+        buf = bytearray().join(map(b64decode, rows))
+        dim = len(buf) // (4 * len(rows))
+        return np.frombuffer(buf, dtype=np.float32).reshape(len(rows), dim)
+
+    first = rows[0]
+    dim = len(first) if isinstance(first, list) else len(b64decode(first)) // 4
+    out = np.empty((len(rows), dim), dtype=np.float32)
+    for i, emb in enumerate(rows):
+        if isinstance(emb, list):
+            # A known count lets numpy fill in a single pass
+            out[i] = np.fromiter(emb, dtype=np.float32, count=dim)
+        else:
+            out[i] = np.frombuffer(b64decode(emb), dtype=np.float32)
+    return out
+
+
+async def _embed_uncached(
+    deployment: str, texts: list[str], kwargs: dict[str, Any]
+) -> np.ndarray:
+    """Embed ``texts`` through Azure in concurrent, rate-limited sub-batches"""
+    client = _get_client("embed")
+    semaphore = _get_semaphore("embed")
+
+    async def create(batch):
+        async with semaphore:
+            return await client.embeddings.create(
+                model=deployment,
+                input=batch,
+                **kwargs
+            )
+
+    # Contiguous packing keeps the rows in input order
+    batches = _split_batches(texts)
+    responses = await asyncio.gather(*[create(batch) for batch in batches])
+    return _decode_embeddings(responses)
+
+
+def _start_embedding(
+    deployment: str,
+    scope: str,
+    texts: list[str],
+    keys: list[bytes],
+    kwargs: dict[str, Any],
+) -> asyncio.Task:
+    """Fetch and cache ``texts`` in a task that concurrent calls can join"""
+
+    async def run():
+        fetched = await _embed_uncached(deployment, texts, kwargs)
+        _embed_widths[scope] = fetched.shape[1]
+        _embed_cache_put(keys, fetched)
+        return fetched
+
+    task = asyncio.ensure_future(run())
+    for row, key in enumerate(keys):
+        _embed_inflight[key] = (task, row)
+
+    def done(_):
+        for key in keys:
+            entry = _embed_inflight.get(key)
+            if entry is not None and entry[0] is task:
+                del _embed_inflight[key]
+
+    task.add_done_callback(done)
+    return task
+
+
+def _get_embed_cache():
+    """Open the on-disk embedding cache, or return None when it is disabled"""
+    global _embed_cache
+    if _embed_cache is None and AZURE_EMBED_CACHE_DIR:
+        os.makedirs(AZURE_EMBED_CACHE_DIR, exist_ok=True)
+        _embed_cache = sqlite3.connect(
+            os.path.join(AZURE_EMBED_CACHE_DIR, "embeddings.sqlite3"),
+            check_same_thread=False,
+        )
+        _embed_cache.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, embedding BLOB NOT NULL)"
+        )
+    return _embed_cache
+
+
+def _embed_cache_key(scope: str, text: str) -> bytes:
+    """Key of ``text`` embedded under ``scope``, the deployment plus any ``dimensions``"""
+    return hashlib.sha256((scope + "\0" + text).encode()).digest()
+
+
+def _embed_cache_get(keys: list[bytes]) -> dict[bytes, bytes]:
+    """Fetch the cached embedding bytes for ``keys``, missing keys are omitted"""
+    cache = _get_embed_cache()
+    if cache is None:
+        return {}
+    found = {}
+    # Stay below SQLite's limit on bound parameters per statement
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        found.update(cache.execute(
+            f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+            chunk,
+        ))
+    return found
+
+
+def _embed_cache_put(keys: list[bytes], embeddings: np.ndarray) -> None:
+    cache = _get_embed_cache()
+    if cache is None:
+        return
+    with cache:
+        cache.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+            [(key, row.tobytes()) for key, row in zip(keys, embeddings)],
+        )
+
+
+def _llm_cache_key(deployment, system_prompt, history_messages, prompt, kwargs):
+    """Key of a completion request, or None if its response must not be cached"""
+    if AZURE_LLM_CACHE_SIZE <= 0 or kwargs.get("stream"):
+        return None
+    # An unset temperature samples at Azure's default of 1.0
+    if not AZURE_LLM_CACHE_HOT and kwargs.get("temperature") != 0:
+        return None
+    payload = json.dumps(
+        [deployment, system_prompt, history_messages, prompt, sorted(kwargs.items())],
+        default=str,
+        sort_keys=True,
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+
+def _llm_cache_put(key: bytes, content: str) -> None:
+    _llm_cache[key] = content
+    _llm_cache.move_to_end(key)
+    while len(_llm_cache) > AZURE_LLM_CACHE_SIZE:
+        _llm_cache.popitem(last=False)
+
+
+async def close_clients() -> None:
+    """Close the shared Azure OpenAI clients, call once on shutdown"""
+    loop = asyncio.get_running_loop()
+    for key, (client_loop, client) in list(_clients.items()):
+        # Clients of other (already finished) loops cannot be awaited here
+        if client_loop is loop:
+            await client.close()
+        del _clients[key]
+    _semaphores.clear()
+
+
+async def _complete(
+    deployment, system_prompt, history_messages, prompt, kwargs, cache_key=None
+) -> str:
+    """Send a chat completion request and cache the answer under ``cache_key``"""
+    client = _get_client("llm")
+    
+    # Prepare messages
+    messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+    if history_messages:
+        messages.extend(history_messages)
+    if prompt:
+        messages.append({"role": "user", "content": prompt})
+    
+    # Call Azure OpenAI Chat Completions API
+    async with _get_semaphore("llm"):
+        response = await client.chat.completions.create(
+            model=deployment,
+            messages=messages,
+            **kwargs
+        )
+    
+    content = response.choices[0].message.content
+    if cache_key is not None:
+        _llm_cache_put(cache_key, content)
+    return content
+
 
 async def azure_openai_complete_if_cache(
     prompt,
@@ -22,46 +397,34 @@ async def azure_openai_complete_if_cache(
 ) -> str:
     """Azure OpenAI LLM completion function for RAGAnything"""
     
-    api_key = os.getenv("AZURE_OPENAI_API_KEY")
-    endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    deployment = os.getenv("AZURE_OPENAI_LLM_DEPLOYMENT")
-    api_version = os.getenv("AZURE_LLM_API_VERSION", "2024-08-01-preview")
-    
-    if not all([api_key, endpoint, deployment]):
+    deployment = _config.llm_deployment
+    if not (_config.api_key and _config.endpoint and deployment):
         raise ValueError("Missing required Azure OpenAI configuration")
     
-    client = AsyncAzureOpenAI(
-        api_key=api_key,
-        azure_endpoint=endpoint,
-        api_version=api_version
-    )
-    
-    # Prepare messages
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    
-    for msg in history_messages:
-        messages.append(msg)
-    
-    if prompt:
-        messages.append({"role": "user", "content": prompt})
+    filtered_kwargs = _filter_kwargs(kwargs)
     
-    # Filter out LightRAG-specific parameters that should not be passed to the API
-    lightrag_params = {
-        'azure_endpoint', 'api_version', 'azure_deployment', 'hashing_kv', 
-        'keyword_extraction', 'enable_cot'
-    }
-    filtered_kwargs = {k: v for k, v in kwargs.items() if k not in lightrag_params}
-    
-    # Call Azure OpenAI Chat Completions API
-    response = await client.chat.completions.create(
-        model=deployment,
-        messages=messages,
-        **filtered_kwargs
+    cache_key = _llm_cache_key(
+        deployment, system_prompt, history_messages, prompt, filtered_kwargs
     )
+    if cache_key is not None and cache_key in _llm_cache:
+        _llm_cache.move_to_end(cache_key)
+        return _llm_cache[cache_key]
     
-    return response.choices[0].message.content
+    if cache_key is None:
+        return await _complete(
+            deployment, system_prompt, history_messages, prompt, filtered_kwargs
+        )
+    
+    # Join an identical request that is already in flight instead of resending it
+    task = _llm_inflight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_complete(
+            deployment, system_prompt, history_messages, prompt, filtered_kwargs, cache_key
+        ))
+        _llm_inflight[cache_key] = task
+        task.add_done_callback(lambda _: _llm_inflight.pop(cache_key, None))
+    # Shielded so one caller giving up does not cancel the request for the others
+    return await asyncio.shield(task)
 
 
 async def azure_openai_embed(
@@ -70,52 +433,116 @@ async def azure_openai_embed(
 ) -> np.ndarray:
     """Azure OpenAI compatible embedding function for LightRAG"""
     
-    load_dotenv()
+    deployment = _config.embed_deployment
+    if not (_config.api_key and _config.endpoint and deployment):
+        raise ValueError("Missing required Azure OpenAI embedding configuration")
+    
+    filtered_kwargs = _filter_kwargs(kwargs)
+    # base64 responses are ~4x smaller than JSON float arrays
+    filtered_kwargs.setdefault("encoding_format", "base64")
     
-    # Get Azure OpenAI configuration
-    api_key = os.getenv('AZURE_OPENAI_API_KEY')
-    endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')  # e.g., https://your-resource.openai.azure.com
-    deployment = os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT')  # e.g., text-embedding-3-small
-    # Use embedding-specific API version
-    api_version = os.getenv('AZURE_EMBEDDING_API_VERSION', '2023-05-15')
+    # Handle single text or list of texts
+    if isinstance(texts, str):
+        text_input = [texts]
+    else:
+        text_input = texts
     
-    if not all([api_key, endpoint, deployment]):
-        raise ValueError("Missing required Azure OpenAI embedding configuration")
+    # A dimensions argument changes the width of every row, so it is part of
+    # the cache and in-flight keys as well
+    dimensions = filtered_kwargs.get("dimensions")
+    cache_scope = deployment if dimensions is None else f"{deployment}\0{dimensions}"
+    # Width of this scope's rows, None until a request or the cache shows it
+    known_width = dimensions or _embed_widths.get(cache_scope)
+    if not text_input:
+        return np.empty((0, known_width or azure_openai_embed.embedding_dim), dtype=np.float32)
     
-    # Filter out LightRAG-specific parameters that should not be passed to the API
-    lightrag_params = {
-        'azure_endpoint', 'api_version', 'azure_deployment', 'hashing_kv', 
-        'keyword_extraction', 'enable_cot'
-    }
-    filtered_kwargs = {k: v for k, v in kwargs.items() if k not in lightrag_params}
-    
-    client = AsyncAzureOpenAI(
-        api_key=api_key,
-        azure_endpoint=endpoint,
-        api_version=api_version
-    )
+    # Embed each distinct text once and scatter the rows back at the end
+    index: dict[str, int] = {}
+    inverse = [index.setdefault(text, len(index)) for text in text_input]
+    unique = list(index)
     
-    try:
-        # Handle single text or list of texts
-        if isinstance(texts, str):
-            text_input = [texts]
+    # Serve what we can from the cache, only the misses go to Azure
+    keys = [_embed_cache_key(cache_scope, text) for text in unique]
+    cached = _embed_cache_get(keys)
+    hits = []
+    missing = []
+    for i, key in enumerate(keys):
+        if not unique[i]:
+            # Azure rejects empty inputs, they keep zero vectors
+            continue
+        emb = cached.get(key)
+        if emb is not None and known_width is None:
+            # The first cached row tells the width of the rest
+            known_width = _embed_widths[cache_scope] = len(emb) // 4
+        if emb is not None and len(emb) == known_width * 4:
+            hits.append((i, emb))
         else:
-            text_input = texts
-        
-        response = await client.embeddings.create(
-            model=deployment,
-            input=text_input,
-            **filtered_kwargs
+            missing.append(i)
+    
+    # Texts that another call is already fetching are awaited, not resent
+    joined = []
+    fetch = []
+    for i in missing:
+        entry = _embed_inflight.get(keys[i])
+        if entry is not None:
+            joined.append((i, entry))
+        else:
+            fetch.append(i)
+    
+    task = None
+    if fetch:
+        task = _start_embedding(
+            deployment,
+            cache_scope,
+            [unique[i] for i in fetch],
+            [keys[i] for i in fetch],
+            filtered_kwargs,
         )
-        
-        return np.array([
-            np.array(dp.embedding, dtype=np.float32)
-            if isinstance(dp.embedding, list)
-            else np.frombuffer(base64.b64decode(dp.embedding), dtype=np.float32)
-            for dp in response.data
-        ])
-    finally:
-        await client.close()
+    
+    # Awaits are shielded so one caller giving up does not cancel the others
+    if len(fetch) == len(text_input):
+        # Nothing cached, duplicated, empty or joined: hand the matrix over as is
+        return await asyncio.shield(task)
+    
+    fetched = await asyncio.shield(task) if task is not None else None
+    joined_rows = []
+    for i, (other, row) in joined:
+        joined_rows.append((i, (await asyncio.shield(other))[row]))
+    
+    # Rows in hand decide the width; only empty inputs fall back to the default
+    if fetched is not None:
+        width = fetched.shape[1]
+    elif joined_rows:
+        width = joined_rows[0][1].shape[0]
+    else:
+        width = known_width or azure_openai_embed.embedding_dim
+    
+    if hits and len(hits[0][1]) != width * 4:
+        # The deployment now returns another width than it did when these
+        # rows were cached, so they are stale and fetched again
+        stale = [i for i, _ in hits]
+        hits = []
+        fetch += stale
+        refetched = await asyncio.shield(_start_embedding(
+            deployment,
+            cache_scope,
+            [unique[i] for i in stale],
+            [keys[i] for i in stale],
+            filtered_kwargs,
+        ))
+        fetched = refetched if fetched is None else np.concatenate([fetched, refetched])
+    
+    out = np.zeros((len(unique), width), dtype=np.float32)
+    for i, emb in hits:
+        out[i] = np.frombuffer(emb, dtype=np.float32)
+    if fetched is not None:
+        out[fetch] = fetched
+    for i, emb in joined_rows:
+        out[i] = emb
+    
+    if len(unique) < len(text_input):
+        return out[inverse]
+    return out
 
 # Add the embedding_dim attribute required by LightRAG
 azure_openai_embed.embedding_dim = 1536
@@ -18,7 +18,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 sys.path.insert(0, str(Path(__file__).parent))
 
 # Import our custom Azure OpenAI functions
-from azure_integration.azure_lightrag_fix import get_azure_openai_functions
+from azure_integration.azure_lightrag_fix import get_azure_openai_functions, close_clients
 
 # Import RAGAnything components
 from raganything import RAGAnything, RAGAnythingConfig
@@ -99,6 +99,8 @@ async def process_with_custom_azure_openai(file_path: str):
             logger.info("✅ RAGAnything finalized successfully")
         except Exception as cleanup_error:
             logger.warning(f"Warning: Failed to finalize RAGAnything: {cleanup_error}")
+        # Release the pooled Azure OpenAI connections
+        await close_clients()
 
 async def main():
     """Main function"""
@@ -69,8 +69,8 @@ async def process_with_azure_openai(file_path: str, output_dir: str = "./output"
         )
         
         # Define LLM model function for Azure OpenAI
-        def llm_model_func(prompt, system_prompt=None, history_messages=[], **kwargs):
-            return openai_complete_if_cache(
+        async def llm_model_func(prompt, system_prompt=None, history_messages=[], **kwargs):
+            return await openai_complete_if_cache(
                 azure_config['llm_model'],
                 prompt,
                 system_prompt=system_prompt,
@@ -81,9 +81,9 @@ async def process_with_azure_openai(file_path: str, output_dir: str = "./output"
             )
         
         # Define vision model function for Azure OpenAI
-        def vision_model_func(prompt, system_prompt=None, history_messages=[], image_data=None, messages=None, **kwargs):
+        async def vision_model_func(prompt, system_prompt=None, history_messages=[], image_data=None, messages=None, **kwargs):
             if messages:
-                return openai_complete_if_cache(
+                return await openai_complete_if_cache(
                     "gpt-4o",  # Use vision model
                     "",
                     system_prompt=None,
@@ -94,7 +94,7 @@ async def process_with_azure_openai(file_path: str, output_dir: str = "./output"
                     **kwargs,
                 )
             elif image_data:
-                return openai_complete_if_cache(
+                return await openai_complete_if_cache(
                     "gpt-4o",
                     "",
                     system_prompt=None,
@@ -117,7 +117,7 @@ async def process_with_azure_openai(file_path: str, output_dir: str = "./output"
                     **kwargs,
                 )
             else:
-                return llm_model_func(prompt, system_prompt, history_messages, **kwargs)
+                return await llm_model_func(prompt, system_prompt, history_messages, **kwargs)
         
         # Define embedding function for Azure OpenAI
         embedding_func = EmbeddingFunc(
@@ -149,27 +149,33 @@ async def main():
     logger.info("🔍 Starting Azure RAGAnything Integration Debug")
     logger.info("=" * 60)
     
-    # Step 1: Test Azure functions
-    step1_success = await test_azure_functions_basic()
-    if not step1_success:
-        logger.error("❌ Step 1 failed - Azure functions not working")
-        sys.exit(1)
+    try:
+        # Step 1: Test Azure functions
+        step1_success = await test_azure_functions_basic()
+        if not step1_success:
+            logger.error("❌ Step 1 failed - Azure functions not working")
+            sys.exit(1)
     
-    # Step 2: Test RAGAnything config
-    step2_success = await test_raganything_config()
-    if not step2_success:
-        logger.error("❌ Step 2 failed - RAGAnything config issues")
-        sys.exit(1)
+        # Step 2: Test RAGAnything config
+        step2_success = await test_raganything_config()
+        if not step2_success:
+            logger.error("❌ Step 2 failed - RAGAnything config issues")
+            sys.exit(1)
     
-    # Step 3: Test simple text processing
-    step3_success = await test_simple_text_processing()
-    if not step3_success:
-        logger.error("❌ Step 3 failed - Text processing issues")
-        sys.exit(1)
+        # Step 3: Test simple text processing
+        step3_success = await test_simple_text_processing()
+        if not step3_success:
+            logger.error("❌ Step 3 failed - Text processing issues")
+            sys.exit(1)
     
-    logger.info("=" * 60)
-    logger.info("🎉 All debug steps passed successfully!")
-    logger.info("The issue might be specific to PDF processing or the specific file.")
+        logger.info("=" * 60)
+        logger.info("🎉 All debug steps passed successfully!")
+        logger.info("The issue might be specific to PDF processing or the specific file.")
+    finally:
+        # Release the pooled Azure OpenAI connections if the functions were loaded
+        azure_fix = sys.modules.get("azure_integration.azure_lightrag_fix")
+        if azure_fix is not None:
+            await azure_fix.close_clients()
 
 if __name__ == "__main__":
     try:
@@ -12,7 +12,7 @@ import aiohttp
 # Load environment variables
 load_dotenv()
 
-async def test_direct_url_request():
+async def test_direct_url_request(session: aiohttp.ClientSession):
     """直接使用完整URL测试（模拟RAGAnything的方式）"""
     
     print("=== 测试1: 直接使用完整URL (模拟RAGAnything方式) ===")
@@ -35,22 +35,21 @@ async def test_direct_url_request():
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            print("发送直接HTTP请求...")
-            async with session.post(full_embedding_url, json=payload, headers=headers) as response:
-                print(f"状态码: {response.status}")
-                print(f"响应头: {dict(response.headers)}")
-                
-                if response.status == 200:
-                    result = await response.json()
-                    print("✅ 直接URL请求成功!")
-                    print(f"   嵌入维度: {len(result['data'][0]['embedding'])}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    print(f"❌ 直接URL请求失败!")
-                    print(f"   错误内容: {error_text}")
-                    return False
+        print("发送直接HTTP请求...")
+        async with session.post(full_embedding_url, json=payload, headers=headers) as response:
+            print(f"状态码: {response.status}")
+            print(f"响应头: {dict(response.headers)}")
+            
+            if response.status == 200:
+                result = await response.json()
+                print("✅ 直接URL请求成功!")
+                print(f"   嵌入维度: {len(result['data'][0]['embedding'])}")
+                return True
+            else:
+                error_text = await response.text()
+                print(f"❌ 直接URL请求失败!")
+                print(f"   错误内容: {error_text}")
+                return False
     except Exception as e:
         print(f"❌ 请求异常: {str(e)}")
         return False
@@ -89,7 +88,7 @@ async def test_azure_client_method():
         print(f"❌ Azure客户端请求失败: {str(e)}")
         return False
 
-async def test_llm_request():
+async def test_llm_request(session: aiohttp.ClientSession):
     """测试LLM请求"""
     
     print("\n=== 测试3: LLM请求测试 ===")
@@ -111,21 +110,20 @@ async def test_llm_request():
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            print("发送LLM请求...")
-            async with session.post(full_llm_url, json=payload, headers=headers) as response:
-                print(f"状态码: {response.status}")
-                
-                if response.status == 200:
-                    result = await response.json()
-                    print("✅ LLM请求成功!")
-                    print(f"   响应: {result['choices'][0]['message']['content']}")
-                    return True
-                else:
-                    error_text = await response.text()
-                    print(f"❌ LLM请求失败!")
-                    print(f"   错误内容: {error_text}")
-                    return False
+        print("发送LLM请求...")
+        async with session.post(full_llm_url, json=payload, headers=headers) as response:
+            print(f"状态码: {response.status}")
+            
+            if response.status == 200:
+                result = await response.json()
+                print("✅ LLM请求成功!")
+                print(f"   响应: {result['choices'][0]['message']['content']}")
+                return True
+            else:
+                error_text = await response.text()
+                print(f"❌ LLM请求失败!")
+                print(f"   错误内容: {error_text}")
+                return False
     except Exception as e:
         print(f"❌ LLM请求异常: {str(e)}")
         return False
@@ -135,14 +133,19 @@ async def main():
     print("开始调试Azure OpenAI配置...")
     print("=" * 50)
     
-    # 测试1: 直接URL方式（RAGAnything使用的方式）
-    test1_result = await test_direct_url_request()
-    
-    # 测试2: Azure客户端方式（我们之前成功的方式）
-    test2_result = await test_azure_client_method()
-    
-    # 测试3: LLM请求
-    test3_result = await test_llm_request()
+    # 所有HTTP测试共用一个会话，复用连接池避免重复的TCP/TLS握手
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300)
+    )
+    async with session:
+        # 测试1: 直接URL方式（RAGAnything使用的方式）
+        test1_result = await test_direct_url_request(session)
+        
+        # 测试2: Azure客户端方式（我们之前成功的方式）
+        test2_result = await test_azure_client_method()
+        
+        # 测试3: LLM请求
+        test3_result = await test_llm_request(session)
     
     print("\n" + "=" * 50)
     print("测试结果总结:")
@@ -4,44 +4,116 @@ Debug Azure OpenAI URL construction
 """
 
 import os
+import sys
+from dataclasses import dataclass
+from functools import cache
 from dotenv import load_dotenv
 
+
+@dataclass(frozen=True, slots=True)
+class AzureEnv:
+    """Snapshot of the Azure OpenAI environment variables"""
+
+    api_key: str | None
+    endpoint: str | None
+    llm_deployment: str | None
+    embed_deployment: str | None
+    api_version: str
+    # Base and full request URLs as they would be built in our functions
+    llm_base_url: str | None
+    embed_base_url: str | None
+    llm_url: str | None
+    embed_url: str | None
+
+
+@cache
+def _ensure_env() -> None:
+    """Load .env once per process; variables already set take precedence
+
+    When tools/compile_env.py has generated ``_env_cache.py`` it is imported
+    instead, so .env is not parsed at all.
+    """
+    try:
+        import _env_cache  # noqa: F401
+    except ImportError:
+        load_dotenv(override=False)
+
+
+@cache
+def _azure_env() -> AzureEnv:
+    """Read the Azure OpenAI environment once per process"""
+    _ensure_env()
+    endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
+    llm_deployment = os.getenv('AZURE_OPENAI_LLM_DEPLOYMENT')
+    embed_deployment = os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT')
+    
+    api_version = os.getenv('AZURE_OPENAI_API_VERSION', '2024-02-01')
+    
+    # Built and interned once, so no URL formatting happens per request
+    llm_base_url = llm_url = None
+    if endpoint and llm_deployment:
+        llm_base_url = sys.intern(f"{endpoint}/openai/deployments/{llm_deployment}")
+        llm_url = sys.intern(f"{llm_base_url}/chat/completions?api-version={api_version}")
+    embed_base_url = embed_url = None
+    if endpoint and embed_deployment:
+        embed_base_url = sys.intern(f"{endpoint}/openai/deployments/{embed_deployment}")
+        embed_url = sys.intern(f"{embed_base_url}/embeddings?api-version={api_version}")
+    
+    return AzureEnv(
+        api_key=os.getenv('AZURE_OPENAI_API_KEY'),
+        endpoint=endpoint,
+        llm_deployment=llm_deployment,
+        embed_deployment=embed_deployment,
+        api_version=api_version,
+        llm_base_url=llm_base_url,
+        embed_base_url=embed_base_url,
+        llm_url=llm_url,
+        embed_url=embed_url,
+    )
+
 def debug_azure_urls():
     """Debug URL construction for Azure OpenAI"""
     
-    load_dotenv()
+    _ensure_env()
     
-    print("🔍 Debugging Azure OpenAI URL Construction")
-    print("=" * 60)
+    # Collect the report and write it out in one go
+    parts = [
+        "🔍 Debugging Azure OpenAI URL Construction",
+        "=" * 60,
+    ]
     
     # Get current environment variables
-    api_key = os.getenv('AZURE_OPENAI_API_KEY')
-    endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
-    llm_deployment = os.getenv('AZURE_OPENAI_LLM_DEPLOYMENT')
-    embed_deployment = os.getenv('AZURE_OPENAI_EMBEDDING_DEPLOYMENT')
-    api_version = os.getenv('AZURE_OPENAI_API_VERSION', '2024-02-01')
+    env = _azure_env()
     
-    print(f"API Key: {'✅' if api_key else '❌'}")
-    print(f"Endpoint: {endpoint}")
-    print(f"LLM Deployment: {llm_deployment}")
-    print(f"Embed Deployment: {embed_deployment}")
-    print(f"API Version: {api_version}")
+    parts += [
+        f"API Key: {'✅' if env.api_key else '❌'}",
+        f"Endpoint: {env.endpoint}",
+        f"LLM Deployment: {env.llm_deployment}",
+        f"Embed Deployment: {env.embed_deployment}",
+        f"API Version: {env.api_version}",
+    ]
     
     # Construct URLs as they would be in our functions
-    if endpoint and llm_deployment:
-        llm_base_url = f"{endpoint}/openai/deployments/{llm_deployment}"
-        print(f"\n🔗 LLM Base URL: {llm_base_url}")
-        print(f"   Full LLM URL would be: {llm_base_url}/chat/completions?api-version={api_version}")
+    if env.llm_base_url:
+        parts += [
+            f"\n🔗 LLM Base URL: {env.llm_base_url}",
+            f"   Full LLM URL would be: {env.llm_url}",
+        ]
     
-    if endpoint and embed_deployment:
-        embed_base_url = f"{endpoint}/openai/deployments/{embed_deployment}"
-        print(f"\n🔗 Embed Base URL: {embed_base_url}")
-        print(f"   Full Embed URL would be: {embed_base_url}/embeddings?api-version={api_version}")
+    if env.embed_base_url:
+        parts += [
+            f"\n🔗 Embed Base URL: {env.embed_base_url}",
+            f"   Full Embed URL would be: {env.embed_url}",
+        ]
     
     # Show expected format for comparison
-    print(f"\n📋 Expected Azure OpenAI URL format:")
-    print(f"   https://<resource-name>.openai.azure.com/openai/deployments/<deployment-name>/chat/completions?api-version=<api-version>")
-    print(f"   https://<resource-name>.openai.azure.com/openai/deployments/<deployment-name>/embeddings?api-version=<api-version>")
+    parts += [
+        "\n📋 Expected Azure OpenAI URL format:",
+        "   https://<resource-name>.openai.azure.com/openai/deployments/<deployment-name>/chat/completions?api-version=<api-version>",
+        "   https://<resource-name>.openai.azure.com/openai/deployments/<deployment-name>/embeddings?api-version=<api-version>",
+    ]
+    
+    sys.stdout.write("\n".join(parts) + "\n")
 
 if __name__ == "__main__":
-    debug_azure_urls()
\ No newline at end of file
+    debug_azure_urls()
@@ -7,10 +7,22 @@ This version properly formats Azure OpenAI URLs for LightRAG compatibility.
 
 import asyncio
 import argparse
+import binascii
+import functools
+import hashlib
+import importlib.util
 import logging
 import os
+import sqlite3
+import sys
+import traceback
+from collections import OrderedDict
+from collections.abc import Sequence
 from pathlib import Path
 
+import httpx
+import numpy as np
+import tiktoken
 from raganything import RAGAnything, RAGAnythingConfig
 from lightrag.llm.openai import openai_complete_if_cache, openai_embed
 from lightrag.utils import EmbeddingFunc
@@ -18,6 +30,17 @@ from lightrag.utils import EmbeddingFunc
 # Import our Azure configuration parser
 from azure_config_parser import parse_azure_openai_config
 
+# libuv-based event loop (winloop on Windows), used when installed
+try:
+    if sys.platform == "win32":
+        import winloop as uvloop
+    else:
+        import uvloop
+
+    UVLOOP_AVAILABLE = True
+except ImportError:
+    UVLOOP_AVAILABLE = False
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,14 +48,351 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def process_with_fixed_azure_openai(file_path: str, output_dir: str = "./output"):
+
+class _SharedAsyncClient(httpx.AsyncClient):
+    """httpx client shared by every LLM and embedding call of one run
+
+    LightRAG closes its AsyncOpenAI client after each request, which would
+    close this client as well, so aclose() is a no-op and shutdown() closes
+    the connection pool for real.
+    """
+
+    async def aclose(self):
+        pass
+
+    async def shutdown(self):
+        await super().aclose()
+
+
+def _new_http_client():
+    """Create the keep-alive connection pool shared by one run
+
+    Requests are multiplexed over HTTP/2 when h2 is installed, so they skip
+    the TCP and TLS handshakes.
+    """
+    return _SharedAsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        timeout=httpx.Timeout(float(os.getenv("TIMEOUT", "240")), connect=5.0),
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    """The cl100k_base encoding, or None if tiktoken cannot download it"""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("cl100k_base unavailable, estimating embedding token counts: %s", e)
+        return None
+
+def _count_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        # Every token covers at least one byte, so this never undercounts
+        return len(text.encode())
+    return len(encoding.encode_ordinary(text))
+
+
+class _EmbedBatcher:
+    """Coalesce concurrent embedding calls into shared requests
+
+    Texts submitted within ``window`` seconds of each other are sent in one
+    request of at most ``max_texts`` texts and ``max_tokens`` tokens, and
+    every caller gets back the rows for its own texts. At most
+    ``max_concurrency`` requests are in flight, to stay clear of Azure rate
+    limits.
+    """
+
+    def __init__(
+        self,
+        embed,
+        embedding_dim,
+        max_texts=16,
+        max_tokens=8192,
+        window=0.005,
+        max_concurrency=8,
+    ):
+        self._embed = embed
+        # Created per batcher, so it never outlives the event loop it runs on
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._embedding_dim = embedding_dim
+        self._max_texts = max_texts
+        self._max_tokens = max_tokens
+        self._window = window
+        self._pending = []
+        self._pending_tokens = 0
+        self._flush_handle = None
+        self._requests = set()
+
+    async def submit_many(self, texts):
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            # Tokens never outnumber UTF-8 bytes, so texts that fit by bytes
+            # alone are not tokenized (the pending count is an upper bound)
+            tokens = len(text.encode())
+            if self._pending_tokens + tokens > self._max_tokens:
+                tokens = _count_tokens(text)
+            if self._pending and self._pending_tokens + tokens > self._max_tokens:
+                self._flush()
+            future = loop.create_future()
+            self._pending.append((text, future))
+            self._pending_tokens += tokens
+            futures.append(future)
+            if len(self._pending) >= self._max_texts:
+                self._flush()
+        
+        if not futures:
+            return np.empty((0, self._embedding_dim), dtype=np.float32)
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._window, self._flush)
+        return np.stack(await asyncio.gather(*futures))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch = self._pending
+        self._pending = []
+        self._pending_tokens = 0
+        if batch:
+            request = asyncio.ensure_future(self._send(batch))
+            # Keep a reference so the request is not garbage collected mid-flight
+            self._requests.add(request)
+            request.add_done_callback(self._requests.discard)
+
+    async def _send(self, batch):
+        try:
+            async with self._semaphore:
+                embeddings = await self._embed([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+        # A short response must not leave the remaining callers waiting forever
+        if len(embeddings) < len(batch):
+            error = RuntimeError(
+                f"Expected {len(batch)} embeddings, got {len(embeddings)}"
+            )
+            for _, future in batch[len(embeddings):]:
+                if not future.done():
+                    future.set_exception(error)
+
+class _EmbeddingCache:
+    """Content-addressed embedding cache in front of the embedding function
+
+    Embeddings are keyed by the deployment, ``embedding_dim`` and text, kept
+    in an in-memory LRU of ``max_memory`` rows and persisted to SQLite at
+    ``path``, so only texts that were never embedded before are sent to
+    Azure. Changing ``EMBEDDING_DIM`` starts a fresh key space instead of
+    serving rows of the old width.
+    """
+
+    def __init__(self, embed, embedding_dim, deployment, path, max_memory=10_000):
+        self._embed = embed
+        self._embedding_dim = embedding_dim
+        self._deployment = deployment
+        self._scope = f"{deployment}\0{embedding_dim}\0".encode()
+        self._memory = OrderedDict()
+        self._max_memory = max_memory
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, embedding BLOB NOT NULL)"
+        )
+
+    def _key(self, text):
+        return hashlib.sha256(self._scope + text.encode()).digest()
+
+    def _remember(self, key, row):
+        self._memory[key] = row
+        if len(self._memory) > self._max_memory:
+            self._memory.popitem(last=False)
+
+    def _load(self, keys):
+        """Fetch ``keys`` from SQLite, missing keys are omitted
+
+        The width is part of every key and rows are checked before they are
+        stored, so everything found here is ``embedding_dim`` wide.
+        """
+        found = {}
+        # Stay below SQLite's limit on bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, blob in self._db.execute(
+                f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+                chunk,
+            ):
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    async def cached_embed(self, texts):
+        if not texts:
+            return np.empty((0, self._embedding_dim), dtype=np.float32)
+        keys = [self._key(text) for text in texts]
+        rows = {}
+        for key in keys:
+            row = self._memory.get(key)
+            if row is not None:
+                self._memory.move_to_end(key)
+                rows[key] = row
+        
+        unseen = [key for key in dict.fromkeys(keys) if key not in rows]
+        if unseen:
+            for key, row in self._load(unseen).items():
+                rows[key] = row
+                self._remember(key, row)
+        
+        # Embed each missing text once, however often it repeats in ``texts``
+        misses = {}
+        for key, text in zip(keys, texts):
+            if key not in rows:
+                misses.setdefault(key, text)
+        if misses:
+            embeddings = np.asarray(await self._embed(list(misses.values())), dtype=np.float32)
+            if embeddings.shape[1:] != (self._embedding_dim,):
+                raise ValueError(
+                    f"Deployment {self._deployment} returned embeddings of shape "
+                    f"{embeddings.shape[1:]}, but EMBEDDING_DIM is {self._embedding_dim}"
+                )
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                    [(key, row.tobytes()) for key, row in zip(misses, embeddings)],
+                )
+            for key, row in zip(misses, embeddings):
+                rows[key] = row
+                self._remember(key, row)
+        return np.stack([rows[key] for key in keys])
+
+    def close(self):
+        self._db.close()
+
+# Shared prefix of every image data URL
+_DATA_URL_PREFIX = sys.intern("data:image/jpeg;base64,")
+
+def _image_to_data_url(img):
+    """Data URL for ``img``, given as base64 text or raw image bytes"""
+    if isinstance(img, (bytes, bytearray, memoryview)):
+        # binascii reads the buffer directly, no bytes() copy of views needed
+        return _DATA_URL_PREFIX + binascii.b2a_base64(img, newline=False).decode("ascii")
+    return _DATA_URL_PREFIX + img
+
+def _build_vision_messages(prompt, image_data, system_prompt=None):
+    """Build the chat messages of a single-image vision request"""
+    user_message = {
+        "role": "user",
+        "content": [
+            {"type": "text", "text": prompt},
+            {
+                "type": "image_url",
+                "image_url": {"url": _image_to_data_url(image_data)}
+            },
+        ],
+    }
+    # Only send a system message when there is one; a None entry is rejected by the API
+    if system_prompt:
+        return [{"role": "system", "content": system_prompt}, user_message]
+    return [user_message]
+
+async def _llm_call(http_client, api_key, base_url, deployment, prompt, system_prompt=None, history_messages=(), **kwargs):
+    """LLM model function using LightRAG-compatible format"""
+    return await openai_complete_if_cache(
+        deployment,  # Use deployment name as model
+        prompt,
+        system_prompt=system_prompt,
+        history_messages=history_messages,
+        api_key=api_key,
+        base_url=base_url,
+        openai_client_configs={"http_client": http_client},
+        **kwargs,
+    )
+
+async def _vision_call(http_client, api_key, base_url, deployment, prompt, system_prompt=None, history_messages=(), image_data=None, messages=None, **kwargs):
+    """Vision model function; plain prompts fall back to the LLM deployment"""
+    # For vision, we might need to use a different deployment
+    model_name = "gpt-4o"  # Vision model deployment name
+    
+    if not messages and image_data:
+        messages = _build_vision_messages(prompt, image_data, system_prompt)
+    if messages:
+        return await openai_complete_if_cache(
+            model_name,
+            "",
+            system_prompt=None,
+            history_messages=[],
+            messages=messages,
+            api_key=api_key,
+            base_url=base_url,
+            openai_client_configs={"http_client": http_client},
+            **kwargs,
+        )
+    return await _llm_call(http_client, api_key, base_url, deployment, prompt, system_prompt, history_messages, **kwargs)
+
+async def _embed_call(http_client, api_key, base_url, deployment, texts):
+    """Embedding function using LightRAG-compatible format"""
+    return await openai_embed(
+        texts,
+        model=deployment,  # Use deployment name as model
+        api_key=api_key,
+        base_url=base_url,
+        client_configs={"http_client": http_client},
+    )
+
+# Test queries run against the processed document
+_DEFAULT_QUERIES: tuple[str, ...] = (
+    "What is the main content of the document?",
+    "What are the key topics discussed?",
+)
+
+async def _run_queries(rag, queries, max_concurrency=4):
+    """Run ``queries`` concurrently, at most ``max_concurrency`` at a time
+
+    Returns one answer per query, or the exception the query raised.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(query):
+        async with semaphore:
+            return await rag.aquery(query, mode="hybrid")
+
+    # asyncio.TaskGroup would cancel the remaining queries on the first
+    # failure and needs Python 3.11, so gather and collect errors per query
+    return await asyncio.gather(*(run(query) for query in queries), return_exceptions=True)
+
+async def process_with_fixed_azure_openai(
+    file_path: str | Path,
+    output_dir: str = "./output",
+    azure_config=None,
+    queries: Sequence[str] = _DEFAULT_QUERIES,
+):
     """Process document using LightRAG-compatible Azure OpenAI configuration"""
     
+    # Owned by this run, so every call gets a fresh, open connection pool
+    http_client = _new_http_client()
+    embed_cache = None
     try:
-        # Parse Azure OpenAI configuration
-        azure_config = parse_azure_openai_config()
+        # Parse Azure OpenAI configuration (cached after the first parse)
+        if azure_config is None:
+            azure_config = parse_azure_openai_config()
         logger.info("✅ Azure OpenAI configuration parsed successfully")
         
+        # Bind the settings to locals once instead of reading the config
+        # object for every use below
+        llm_api_key = azure_config.llm_api_key
+        llm_base_url = azure_config.llm_base_url
+        llm_deployment = azure_config.llm_deployment
+        embed_api_key = azure_config.embed_api_key
+        embed_base_url = azure_config.embed_base_url
+        embed_deployment = azure_config.embed_deployment
+        embed_dim = azure_config.embed_dim
+        
         # Create RAGAnything configuration with new working directory
         config = RAGAnythingConfig(
             working_dir="./rag_storage_new",  # Use new directory to avoid version issues
@@ -43,75 +403,38 @@ async def process_with_fixed_azure_openai(file_path: str, output_dir: str = "./o
             enable_equation_processing=True,
         )
         
-        # Define LLM model function using LightRAG-compatible format
-        def llm_model_func(prompt, system_prompt=None, history_messages=[], **kwargs):
-            return openai_complete_if_cache(
-                azure_config['llm_deployment'],  # Use deployment name as model
-                prompt,
-                system_prompt=system_prompt,
-                history_messages=history_messages,
-                api_key=azure_config['llm_api_key'],
-                base_url=azure_config['llm_base_url'],
-                **kwargs,
-            )
-        
-        # Define vision model function (if needed)
-        def vision_model_func(prompt, system_prompt=None, history_messages=[], image_data=None, messages=None, **kwargs):
-            # For vision, we might need to use a different deployment
-            model_name = "gpt-4o"  # Vision model deployment name
-            
-            if messages:
-                return openai_complete_if_cache(
-                    model_name,
-                    "",
-                    system_prompt=None,
-                    history_messages=[],
-                    messages=messages,
-                    api_key=azure_config['llm_api_key'],
-                    base_url=azure_config['llm_base_url'],
-                    **kwargs,
-                )
-            elif image_data:
-                return openai_complete_if_cache(
-                    model_name,
-                    "",
-                    system_prompt=None,
-                    history_messages=[],
-                    messages=[
-                        {"role": "system", "content": system_prompt} if system_prompt else None,
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "text", "text": prompt},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": f"data:image/jpeg;base64,{image_data}"}
-                                },
-                            ],
-                        },
-                    ],
-                    api_key=azure_config['llm_api_key'],
-                    base_url=azure_config['llm_base_url'],
-                    **kwargs,
-                )
-            else:
-                return llm_model_func(prompt, system_prompt, history_messages, **kwargs)
+        # Bind the deployment settings to the module-level model functions
+        llm_model_func = functools.partial(
+            _llm_call, http_client, llm_api_key, llm_base_url, llm_deployment
+        )
+        vision_model_func = functools.partial(
+            _vision_call, http_client, llm_api_key, llm_base_url, llm_deployment
+        )
         
-        # Define embedding function using LightRAG-compatible format
+        # Concurrent embedding calls are batched into shared requests
+        embed_batcher = _EmbedBatcher(
+            functools.partial(
+                _embed_call, http_client, embed_api_key, embed_base_url, embed_deployment
+            ),
+            embedding_dim=embed_dim,
+            max_tokens=8192,
+        )
+        # Repeated texts are served from the cache persisted in the working directory
+        embed_cache = _EmbeddingCache(
+            embed_batcher.submit_many,
+            embedding_dim=embed_dim,
+            deployment=embed_deployment,
+            path=Path(config.working_dir) / "embed_cache.sqlite3",
+        )
         embedding_func = EmbeddingFunc(
-            embedding_dim=azure_config['embed_dim'],
+            embedding_dim=embed_dim,
             max_token_size=8192,
-            func=lambda texts: openai_embed(
-                texts,
-                model=azure_config['embed_deployment'],  # Use deployment name as model
-                api_key=azure_config['embed_api_key'],
-                base_url=azure_config['embed_base_url'],
-            ),
+            func=embed_cache.cached_embed,
         )
         
         logger.info("🔧 Using LightRAG-compatible Azure OpenAI configuration:")
-        logger.info(f"   LLM: {azure_config['llm_deployment']} @ {azure_config['llm_base_url']}")
-        logger.info(f"   Embedding: {azure_config['embed_deployment']} @ {azure_config['embed_base_url']}")
+        logger.info("   LLM: %s @ %s", llm_deployment, llm_base_url)
+        logger.info("   Embedding: %s @ %s", embed_deployment, embed_base_url)
         
         # Initialize RAGAnything
         rag = RAGAnything(
@@ -121,7 +444,7 @@ async def process_with_fixed_azure_openai(file_path: str, output_dir: str = "./o
             embedding_func=embedding_func,
         )
         
-        logger.info(f"🚀 Processing document: {file_path}")
+        logger.info("🚀 Processing document: %s", file_path)
         
         # Process document
         await rag.process_document_complete(
@@ -135,30 +458,42 @@ async def process_with_fixed_azure_openai(file_path: str, output_dir: str = "./o
         # Test queries
         logger.info("\n🔍 Testing queries:")
         
-        queries = [
-            "What is the main content of the document?",
-            "What are the key topics discussed?",
-        ]
-        
-        for query in queries:
-            logger.info(f"\n📝 Query: {query}")
-            try:
-                result = await rag.aquery(query, mode="hybrid")
-                logger.info(f"✅ Answer: {result}")
-            except Exception as e:
-                logger.error(f"❌ Query failed: {str(e)}")
-                import traceback
-                traceback.print_exc()
+        # Run the queries concurrently so their LLM latency overlaps
+        results = await _run_queries(rag, queries)
+        for query, result in zip(queries, results):
+            logger.info("\n📝 Query: %s", query)
+            if isinstance(result, BaseException):
+                logger.error("❌ Query failed: %s", result)
+                if logger.isEnabledFor(logging.DEBUG):
+                    traceback.print_exception(type(result), result, result.__traceback__)
+            else:
+                logger.info("✅ Answer: %s", result)
         
         # Finalize
         await rag.finalize_storages()
         logger.info("✅ All operations completed successfully!")
         
     except Exception as e:
-        logger.error(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("❌ Error: %s", e)
+        if logger.isEnabledFor(logging.DEBUG):
+            traceback.print_exc()
         raise
+    finally:
+        # Release the embedding cache and the shared connection pool
+        if embed_cache is not None:
+            embed_cache.close()
+        await http_client.shutdown()
+
+def _run(coro):
+    """Run ``coro`` to completion, on a uvloop event loop when available"""
+    if not UVLOOP_AVAILABLE:
+        return asyncio.run(coro)
+    if sys.version_info >= (3, 12):
+        # The event loop policy API that uvloop.install() uses is deprecated
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(coro)
+    uvloop.install()
+    return asyncio.run(coro)
 
 def main():
     parser = argparse.ArgumentParser(description="RAGAnything with fixed Azure OpenAI support")
@@ -168,15 +503,19 @@ def main():
     args = parser.parse_args()
     
     # Validate file exists
-    if not os.path.exists(args.file_path):
-        logger.error(f"❌ File not found: {args.file_path}")
+    src = Path(args.file_path)
+    if not src.is_file():
+        logger.error("❌ File not found: %s", src)
         return
     
     # Create output directory
-    os.makedirs(args.output, exist_ok=True)
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    
+    # Parse the configuration once, before the event loop starts
+    azure_config = parse_azure_openai_config()
     
     # Run processing
-    asyncio.run(process_with_fixed_azure_openai(args.file_path, args.output))
+    _run(process_with_fixed_azure_openai(src, args.output, azure_config))
 
 if __name__ == "__main__":
     print("🔧 RAGAnything Fixed Azure OpenAI Example")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Compile .env into a Python module for the debug tools
+
+``debug_azure_urls.py`` imports the generated ``debug_tools/_env_cache.py``
+when it exists instead of parsing .env on every run; CPython caches its
+bytecode in ``__pycache__``, so the import is close to free. Re-run this
+script after editing .env. The generated file contains secrets and is
+git-ignored.
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+HEADER = '''\
+# Generated by tools/compile_env.py from {source} -- do not edit or commit.
+# Re-run the script after changing the .env file.
+import os
+
+'''
+
+
+def compile_env(env_path: Path, output_path: Path) -> int:
+    """Write ``env_path`` as ``os.environ.setdefault`` calls, return the count"""
+    values = {k: v for k, v in dotenv_values(env_path).items() if v is not None}
+    lines = [HEADER.format(source=env_path.name)]
+    lines += [f"os.environ.setdefault({k!r}, {v!r})\n" for k, v in values.items()]
+
+    # Only the current user may read the generated secrets
+    fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+    return len(values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile .env into debug_tools/_env_cache.py")
+    parser.add_argument("--env", type=Path, default=REPO_ROOT / ".env", help="Path to the .env file")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=REPO_ROOT / "debug_tools" / "_env_cache.py",
+        help="Path of the generated module",
+    )
+    args = parser.parse_args()
+
+    if not args.env.is_file():
+        parser.error(f"{args.env} not found")
+
+    count = compile_env(args.env, args.output)
+    print(f"✅ Wrote {count} variables from {args.env} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()